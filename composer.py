@@ -1,26 +1,62 @@
 # MusicAndMath/composer.py
+import argparse
+import json
+import os
+import shutil
 from main import GAEngine, get_user_chord_progression
 import utils
 import config
+from profiler import PROFILER, add_profile_arguments, enable_from_args
+
+def work_path(name):
+    return os.path.join(config.SYMPHONY_WORK_DIR, name)
+
+def run_section(name, compute, profile=True):
+    """
+    已完成的段落直接从磁盘读取，否则计算后写入磁盘（先写临时文件再替换）。
+    profile=False 用于等待用户输入的段落，不计入性能分析。
+    """
+    path = work_path(name + ".json")
+    if os.path.exists(path):
+        print(f"  [Resume] Loaded {name} from {path}")
+        with open(path) as f:
+            return json.load(f)
+    if profile:
+        PROFILER.section = name
+        with PROFILER.stage(f'section.{name}'):
+            result = compute()
+    else:
+        result = compute()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    # 段落结果落盘后才删除它的断点（训练结束时断点里也保存了结果）
+    checkpoint_path = work_path(name + ".ckpt.gz")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return result
 
 def generate_symphony():
     print(" AI Composer: Starting Symphony Generation")
     print(" Structure: A (Theme) -> A' (Var) -> B (Contrast) -> A (Coda)")
+    os.makedirs(config.SYMPHONY_WORK_DIR, exist_ok=True)
     print("\n【全局设置】是否自定义 Theme A 的和弦走向?")
-    chord_roots_A = get_user_chord_progression()
+    chord_roots_A = run_section("chords_a", get_user_chord_progression, profile=False)
     override_A = {}
     if chord_roots_A:
         override_A['CHORD_ROOTS'] = chord_roots_A
-    engine_standard = GAEngine(target_gens=500) 
-    engine_creative = GAEngine(target_gens=500, mutation_rate=0.1) 
+    engine_standard = GAEngine(target_gens=500, checkpoint_path=work_path("theme_a.ckpt.gz"), keep_checkpoint=True)
+    engine_creative = GAEngine(target_gens=500, mutation_rate=0.1, checkpoint_path=work_path("theme_b.ckpt.gz"), keep_checkpoint=True)
     print("\n[Section 1] Composing Theme A...")
-    theme_a = engine_standard.train(constraints_override=override_A)
+    theme_a = run_section("theme_a", lambda: engine_standard.train(constraints_override=override_A))
     print("\n[Section 2] Composing Variation A'...")
-    engine_var = GAEngine(target_gens=100, mutation_rate=0.2) 
-    theme_a_prime = engine_var.train(initial_seed=theme_a, constraints_override=override_A)
+    engine_var = GAEngine(target_gens=100, mutation_rate=0.2, checkpoint_path=work_path("theme_a_prime.ckpt.gz"),
+                         keep_checkpoint=True)
+    theme_a_prime = run_section("theme_a_prime", lambda: engine_var.train(initial_seed=theme_a, constraints_override=override_A))
     print("\n[Section 3] Composing Theme B (Contrast)...")
     print("是否为 B 段自定义和弦? (回车跳过则使用默认)")
-    chord_roots_B = get_user_chord_progression()
+    chord_roots_B = run_section("chords_b", get_user_chord_progression, profile=False)
     
     override_B = {
         'PITCH_MIN': 72, 
@@ -29,7 +65,7 @@ def generate_symphony():
     }
     if chord_roots_B:
         override_B['CHORD_ROOTS'] = chord_roots_B
-    theme_b = engine_creative.train(constraints_override=override_B)
+    theme_b = run_section("theme_b", lambda: engine_creative.train(constraints_override=override_B))
     print("\n[Section 4] Assembly Coda...")
     theme_a_coda = theme_a 
     full_movement = []
@@ -44,8 +80,14 @@ def generate_symphony():
     roots_B = chord_roots_B if chord_roots_B else config.CHORD_ROOTS
     final_progression.extend(roots_B)
     final_progression.extend(roots_A)
-    utils.save_movement_to_midi(full_movement, output_file, tempo=96, chord_progression=final_progression)
+    with PROFILER.stage('midi_write'):
+        utils.save_movement_to_midi(full_movement, output_file, tempo=96, chord_progression=final_progression)
+    shutil.rmtree(config.SYMPHONY_WORK_DIR, ignore_errors=True)
     print(f"Done! Saved to {output_file}")
 
 if __name__ == "__main__":
-    generate_symphony()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="生成 A-A'-B-A 结构的完整乐章")
+    add_profile_arguments(parser)
+    enable_from_args(parser.parse_args())
+    generate_symphony()
+    PROFILER.report()
\ No newline at end of file
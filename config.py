@@ -6,6 +6,10 @@ STEPS_PER_BEAT = 2      # 【时间精度】每拍被切分成几份。2 代表
 
 TOTAL_STEPS = NUM_BARS * BEATS_PER_BAR * STEPS_PER_BEAT 
 
+# 【乐句长度】结构评分与动机克隆按每 PHRASE_BARS 小节一个乐句处理，
+# 前后两半的首小节互相呼应，前半句结尾倾向半终止。
+PHRASE_BARS = 4
+
 
 # 【音域范围】MIDI 编号。
 # 60=中央C (C4)。50(D3) 到 84(C6) 跨越了约 3 个八度。
@@ -32,6 +36,54 @@ MUTATION_RATE_BASE = 0.05
 # 代表每一代评分最高的个体不经过交叉变异，直接复制到下一代。
 ELITISM_COUNT = 200     
 
+# 【自适应停止】以下条件任意一个满足即提前结束训练，返回目前为止的最优个体。
+# 时间预算（秒）。None 表示不限时。
+TIME_BUDGET = None
+
+# 【目标适应度】最优分数达到该值即停止。None 表示不设目标。
+FITNESS_TARGET = None
+
+# 【平台期检测】在最近 PLATEAU_WINDOW 代内，最优分数的平均每代相对提升率
+# 低于 PLATEAU_MIN_RATE 即判定收敛。窗口应大于重启阈值（50 代），让重启有机会生效。
+# PLATEAU_WINDOW = 0 表示关闭。
+PLATEAU_WINDOW = 120
+PLATEAU_MIN_RATE = 1e-4
+
+# 【多样性下限】种群中不同旋律所占比例低于该值即停止。None 表示关闭。
+DIVERSITY_FLOOR = None
+
+# 【克隆处理】精英复制和未变异的后代会让种群中出现大量相同旋律（相同旋律总是只评估一次）。
+# CLONE_POLICY: None 不处理；'random' 用随机旋律替换多余克隆；'mutate' 用克隆的变异体替换。
+# CLONE_MAX_COPIES: 每个旋律最多保留的副本数。
+CLONE_POLICY = None
+CLONE_MAX_COPIES = 3
+CLONE_MUTATE_RETRIES = 5    # 'mutate' 策略下变异结果仍是已有旋律时的重试次数，之后改用随机旋律
+
+# 【模型引导变异】在变异算子中加入一个由 Transformer 提议音符的算子（需要训练好的 NN_MODEL_PATH）。
+# 每代选中的后代各随机选 MODEL_MUTATION_POSITIONS 个位置，按模型预测分布在调内音中重新采样，整批一次前向。
+# MODEL_MUTATION_WEIGHT 是它在变异算子中的相对权重（其余算子权重之和为 1）。
+MODEL_MUTATION_WEIGHT = 0.15
+MODEL_MUTATION_POSITIONS = 3
+MODEL_MUTATION_TEMPERATURE = 1.0
+
+# 【代理模型筛选】用本次训练已评估过的旋律在线拟合一个线性模型（NumPy 岭回归），
+# 每代多繁殖 1 / SURROGATE_KEEP 倍的后代，去重后按预测分数录取，填满种群后其余的不做完整评估。
+# 完整评估越贵（如 NN 评分）越划算。
+USE_SURROGATE = False
+SURROGATE_KEEP = 0.5              # 通过筛选的后代比例（决定多繁殖的倍数）
+SURROGATE_RETRAIN_INTERVAL = 5    # 每隔多少代重新拟合
+SURROGATE_MIN_SAMPLES = 500       # 样本数达到该值才开始筛选
+SURROGATE_MAX_SAMPLES = 20000     # 只保留最近的样本
+SURROGATE_L2 = 1.0                # 岭回归正则系数
+
+# 【断点续训】每隔多少代保存一次训练状态（需在 GAEngine 中指定 checkpoint_path）。
+# 中断后以相同参数重新运行，会从最近的断点继续。
+CHECKPOINT_INTERVAL = 10
+CHECKPOINT_PATH = "ga_checkpoint.pkl.gz"
+
+# composer.py 的中间结果目录：已完成的段落与断点保存在这里，整首乐章完成后自动删除。
+SYMPHONY_WORK_DIR = "symphony_work"
+
 # 【和弦走向】定义了背景音乐的根音序列。
 # 48(C3), 43(G2), 45(A2), 41(F2) 对应经典的流行走向：C大调 I - V - vi - IV
 CHORD_ROOTS = [48, 43, 45, 41] 
@@ -44,6 +96,29 @@ CHORD_DURATION = 4
 # Pitch Classes: 0=C, 2=D, 4=E, 5=F, 7=G, 9=A, 11=B
 SCALE_C_MAJOR = {0, 2, 4, 5, 7, 9, 11}
 
+# 【长旋律分层生成】long_form.py：先为每个和弦进化单小节动机，再进化动机的编排，最后整体微调。
+LONG_FORM_BARS = 32             # 生成的小节数（32~128）
+MOTIFS_PER_CHORD = 8            # 每个和弦保留的动机数量
+MOTIF_GENERATIONS = 80
+MOTIF_POPULATION = 300
+ARRANGEMENT_GENERATIONS = 150
+ARRANGEMENT_POPULATION = 300
+REFINE_GENERATIONS = 60         # 0 表示跳过微调
+REFINE_POPULATION = 300
+
+# 【适应度缓存】音程、节奏、拍点稳定性这些与绝对音高无关的分数按“音符位置 + 音程序列”缓存，
+# 移调后的旋律、以及使用不同和弦走向的段落都能复用。超过容量时丢弃最早的条目。
+FITNESS_CACHE_SIZE = 200000
+
+# 【终止式评分】是否在适应度中计入结尾终止与半终止。单小节动机（long_form.py）会临时关闭它。
+FITNESS_INCLUDE_CADENCE = True
+
+# 【性能分析】main.py / composer.py 加 --profile 时生效（命令行参数可覆盖）。
+PROFILE_DIR = "profile"             # 汇总表 summary.txt 和 trace 文件的输出目录
+PROFILE_TRACER = "cprofile"         # 抽样代的 trace：cprofile（.prof，可用 snakeviz 查看）、torch（Chrome trace .json）、none
+PROFILE_SAMPLE_EVERY = 50           # 每隔多少代抽样记录一次 trace
+
 USE_NN_FITNESS = True
 NN_MODEL_PATH = "lmd_eval.pth"
+NN_CONTEXT = TOTAL_STEPS   # 【模型上下文】模型训练时的序列长度；更长的旋律按这个宽度滑动窗口评分（位置编码更长的部分没有训练过）
 VOCAB_SIZE = 130
\ No newline at end of file
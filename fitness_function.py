@@ -3,15 +3,14 @@ import config
 import torch
 import torch.nn.functional as F
 from model import MelodyTransformer
+from profiler import PROFILER
 import os
 
 _NN_EVALUATOR = None
 
-def get_nn_score(melodies):
+def get_nn_evaluator():
+    """懒加载共享的 Transformer 评估模型，返回 (model, device)"""
     global _NN_EVALUATOR
-    if not config.USE_NN_FITNESS or not melodies:
-        return [0] * len(melodies)
-    
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     
     if _NN_EVALUATOR is None:
@@ -19,21 +18,47 @@ def get_nn_score(melodies):
         if os.path.exists(config.NN_MODEL_PATH):
             _NN_EVALUATOR.load_state_dict(torch.load(config.NN_MODEL_PATH, map_location=device))
         _NN_EVALUATOR.eval()
+    return _NN_EVALUATOR, device
+
+def get_nn_score(melodies):
+    if not config.USE_NN_FITNESS or not melodies:
+        return [0] * len(melodies)
+    
+    _, device = get_nn_evaluator()
 
     batch_tensor = torch.tensor(melodies, dtype=torch.long).to(device)
     sz = batch_tensor.size(1)
-    mask = torch.triu(torch.ones(sz, sz), diagonal=1).bool().to(device)
+    max_len = min(config.NN_CONTEXT, _NN_EVALUATOR.pos_encoder.size(1))
 
-    with torch.no_grad():
-        logits = _NN_EVALUATOR(batch_tensor, mask=mask) 
-        shift_logits = logits[:, :-1, :].contiguous()
-        shift_labels = batch_tensor[:, 1:].contiguous()
-        loss = F.cross_entropy(shift_logits.view(-1, shift_logits.size(-1)), 
-                              shift_labels.view(-1), reduction='none')
-        individual_losses = loss.view(batch_tensor.size(0), -1).mean(dim=1)
+    with torch.no_grad(), PROFILER.stage('nn.forward'):
+        if sz <= max_len:
+            token_losses = _causal_token_losses(batch_tensor, device)
+        else:
+            # 超出模型训练时的上下文长度时用滑动窗口评分：窗口重叠一半，每个位置只取第一次被预测时的损失
+            stride = max_len // 2
+            parts = []
+            start = 0
+            while True:
+                window_losses = _causal_token_losses(batch_tensor[:, start:start + max_len], device)
+                parts.append(window_losses if start == 0 else window_losses[:, max_len - 1 - stride:])
+                if start + max_len >= sz: break
+                start += stride
+            token_losses = torch.cat(parts, dim=1)
+        individual_losses = token_losses.mean(dim=1)
         
     return (-individual_losses).cpu().tolist()
 
+def _causal_token_losses(batch_tensor, device):
+    """每个位置预测下一个音的交叉熵，形状 (batch, len - 1)"""
+    sz = batch_tensor.size(1)
+    mask = torch.triu(torch.ones(sz, sz), diagonal=1).bool().to(device)
+    logits = _NN_EVALUATOR(batch_tensor, mask=mask) 
+    shift_logits = logits[:, :-1, :].contiguous()
+    shift_labels = batch_tensor[:, 1:].contiguous()
+    loss = F.cross_entropy(shift_logits.view(-1, shift_logits.size(-1)), 
+                          shift_labels.view(-1), reduction='none')
+    return loss.view(batch_tensor.size(0), -1)
+
 SCALE_C_MAJOR = {0, 2, 4, 5, 7, 9, 11}
 
 GROOVE_TEMPLATES = {
@@ -87,12 +112,11 @@ def analyze_melody(melody):
     bars = [melody[i:i+steps_per_bar] for i in range(0, len(melody), steps_per_bar)]
     return events, bars, steps_per_bar
 
-def fit_melodic_flow(events):
+def fit_melodic_intervals(events):
+    """旋律进行中只和音程有关的部分（移调不变）"""
     if len(events) < 2: return 0
     score = 0
     pitches = [e[1] for e in events]
-    current_chords = get_dynamic_chords()
-    num_bars = len(current_chords)
     for i in range(len(pitches) - 1):
         curr_p = pitches[i]
         next_p = pitches[i+1]
@@ -110,6 +134,14 @@ def fit_melodic_flow(events):
                 else: score -= 5
             elif abs(d1) <= 4 and abs(d2) <= 4 and d1 * d2 > 0:
                 score += 5
+    return score
+
+def fit_melodic_resolution(events):
+    """旋律进行中和弦外音级进解决到和弦音的部分（依赖和弦）"""
+    if len(events) < 2: return 0
+    score = 0
+    current_chords = get_dynamic_chords()
+    num_bars = len(current_chords)
     steps_per_bar = config.BEATS_PER_BAR * config.STEPS_PER_BEAT
     for i in range(len(events) - 1):
         curr_idx, curr_p = events[i]
@@ -123,6 +155,9 @@ def fit_melodic_flow(events):
                 score += 30 
     return score
 
+def fit_melodic_flow(events):
+    return fit_melodic_intervals(events) + fit_melodic_resolution(events)
+
 def fit_harmonic_quality(events, steps_per_beat=2):
     score = 0
     steps_per_bar = config.BEATS_PER_BAR * steps_per_beat
@@ -162,7 +197,15 @@ def fit_rhythm_groove(bars):
             score -= 50
     return score
 
-def fit_structure_coherence(events, bars):
+def get_onset_pattern(segment):
+    res = []
+    for i, n in enumerate(segment):
+        is_onset = (n > 0) and (i==0 or n != segment[i-1])
+        res.append(1 if is_onset else 0)
+    return res
+
+def fit_structure_cadence(events):
+    """结构中与音高有关的部分：结尾终止与每个乐句前半句的半终止"""
     if not events: return -100
     score = 0
     last_idx, last_pitch = events[-1]
@@ -170,24 +213,31 @@ def fit_structure_coherence(events, bars):
     elif last_pitch % 12 in {7, 11}: score += 5 
     
     steps_per_bar = config.BEATS_PER_BAR * config.STEPS_PER_BEAT
-    mid_events = [e for e in events if steps_per_bar <= e[0] < 2*steps_per_bar]
-    if mid_events:
-        mid_pitch = mid_events[-1][1]
-        if mid_pitch % 12 in {2, 7, 11}: score += 15 
-        
-    if len(bars) >= 3:
-        def get_onset_pattern(segment):
-            res = []
-            for i, n in enumerate(segment):
-                is_onset = (n > 0) and (i==0 or n != segment[i-1])
-                res.append(1 if is_onset else 0)
-            return res
-        r0 = get_onset_pattern(bars[0])
-        r2 = get_onset_pattern(bars[2])
-        if r0 == r2: score += 15
-        elif sum(1 for a,b in zip(r0,r2) if a==b) >= len(r0)*0.75: score += 10
+    half = config.PHRASE_BARS // 2
+    last_pitch_in_bar = {idx // steps_per_bar: pitch for idx, pitch in events}
+    num_bars = events[-1][0] // steps_per_bar + 1
+    for p in range(0, num_bars, config.PHRASE_BARS):
+        mid_pitch = last_pitch_in_bar.get(p + half - 1)
+        if mid_pitch is not None:
+            if mid_pitch % 12 in {2, 7, 11}: score += 15 
     return score
 
+def fit_structure_rhythm(bars):
+    """结构中与音高无关的部分：每个乐句前后两半首小节的节奏呼应"""
+    score = 0
+    half = config.PHRASE_BARS // 2
+    for p in range(0, len(bars), config.PHRASE_BARS):
+        if p + half < len(bars):
+            r0 = get_onset_pattern(bars[p])
+            r2 = get_onset_pattern(bars[p + half])
+            if r0 == r2: score += 15
+            elif sum(1 for a,b in zip(r0,r2) if a==b) >= len(r0)*0.75: score += 10
+    return score
+
+def fit_structure_coherence(events, bars):
+    if not events: return -100
+    return fit_structure_cadence(events) + fit_structure_rhythm(bars)
+
 def fit_beat_stability(melody):
     score = 0
     steps_per_bar = config.BEATS_PER_BAR * config.STEPS_PER_BEAT 
@@ -220,22 +270,67 @@ def fit_beat_stability(melody):
 
     return score
 
-def get_fitness(melody,use_nn=False):
+_INVARIANT_CACHE = {}
+_INVARIANT_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+def canonical_key(events, length):
+    """移调不变的规范键：音符位置掩码 + 相邻音符的音程序列"""
+    mask = 0
+    for idx, _ in events:
+        mask |= 1 << idx
+    intervals = tuple(events[i+1][1] - events[i][1] for i in range(len(events) - 1))
+    return (length, config.BEATS_PER_BAR, config.STEPS_PER_BEAT, config.PHRASE_BARS, mask, intervals)
+
+def fit_invariant(events, bars, melody):
+    """与绝对音高、和弦走向都无关的加权分数，按规范键缓存，所有段落共用"""
+    key = canonical_key(events, len(melody))
+    score = _INVARIANT_CACHE.get(key)
+    if score is not None:
+        _INVARIANT_CACHE_STATS['hits'] += 1
+        return score
+    _INVARIANT_CACHE_STATS['misses'] += 1
+    with PROFILER.stage('fitness.melodic_intervals'):
+        s_intervals = fit_melodic_intervals(events)
+    with PROFILER.stage('fitness.rhythm_groove'):
+        s_rhythm = fit_rhythm_groove(bars)
+    with PROFILER.stage('fitness.beat_stability'):
+        s_stability = fit_beat_stability(melody)
+    with PROFILER.stage('fitness.structure_rhythm'):
+        s_repeat = fit_structure_rhythm(bars)
+    score = (2.0 * s_intervals) + \
+        (4.0 * s_rhythm) + \
+        (2.1 * s_stability) + \
+        (2.0 * s_repeat)
+    if len(_INVARIANT_CACHE) >= config.FITNESS_CACHE_SIZE:
+        del _INVARIANT_CACHE[next(iter(_INVARIANT_CACHE))]
+    _INVARIANT_CACHE[key] = score
+    return score
+
+def invariant_cache_stats():
+    """不变部分缓存的累计 (命中次数, 未命中次数)"""
+    return _INVARIANT_CACHE_STATS['hits'], _INVARIANT_CACHE_STATS['misses']
+
+def fit_chord_dependent(events, include_cadence=True):
+    """与和弦走向有关的加权分数，每次重新计算"""
+    with PROFILER.stage('fitness.melodic_resolution'):
+        s_resolution = fit_melodic_resolution(events)
+    with PROFILER.stage('fitness.harmonic_quality'):
+        s_harmony = fit_harmonic_quality(events)
+    score = (2.0 * s_resolution) + \
+        (3.0 * s_harmony)
+    if include_cadence:
+        with PROFILER.stage('fitness.structure_cadence'):
+            score += 2.0 * fit_structure_cadence(events)
+    return score
+
+def get_fitness(melody,use_nn=False,include_cadence=None):
     if sum(melody) == 0: return -9999
+    if use_nn:
+        return get_nn_score([melody])[0]
     events, bars, _ = analyze_melody(melody)
     if not events: return -999
-    s_melody    = fit_melodic_flow(events)
-    s_harmony   = fit_harmonic_quality(events)
-    s_rhythm    = fit_rhythm_groove(bars)
-    s_structure = fit_structure_coherence(events, bars)
-    s_stability = fit_beat_stability(melody)
-    s_transformer = get_nn_score(melody)
-    if use_nn:
-        total=s_transformer
-    else:
-        total = (2.0 * s_melody) + \
-            (3.0 * s_harmony) + \
-            (4.0 * s_rhythm) + \
-            (2.1 * s_stability) + \
-            (2.0 * s_structure)
-    return total
\ No newline at end of file
+    with PROFILER.stage('fitness.invariant'):
+        s_invariant = fit_invariant(events, bars, melody)
+    with PROFILER.stage('fitness.chord_dependent'):
+        s_chord = fit_chord_dependent(events, include_cadence if include_cadence is not None else config.FITNESS_INCLUDE_CADENCE)
+    return s_invariant + s_chord
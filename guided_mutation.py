@@ -0,0 +1,42 @@
+# MusicAndMath/guided_mutation.py
+import random
+import torch
+import config
+import utils
+from fitness_function import get_nn_evaluator
+
+def model_guided_mutation(melodies, num_positions=None, temperature=None):
+    """
+    模型引导变异：每条旋律随机选几个位置，按 Transformer 对该位置的预测分布重新采样。
+    采样只在音域内的调内音中进行，整批旋律只做一次前向。原地修改并返回 melodies。
+    """
+    if not melodies: return melodies
+    num_positions = num_positions if num_positions else config.MODEL_MUTATION_POSITIONS
+    temperature = temperature if temperature else config.MODEL_MUTATION_TEMPERATURE
+    allowed = utils.get_scale_notes(config.PITCH_MIN, config.PITCH_MAX)
+    if not allowed: return melodies
+
+    model, device = get_nn_evaluator()
+    window = min(min(len(m) for m in melodies), config.NN_CONTEXT, model.pos_encoder.size(1))
+    if window < 2: return melodies
+
+    # 超出模型训练上下文长度的旋律随机取一个窗口；第 i 个位置由第 i-1 个位置的输出预测
+    starts = [random.randint(0, len(m) - window) for m in melodies]
+    positions = [random.sample(range(1, window), min(num_positions, window - 1)) for _ in melodies]
+    batch_tensor = torch.tensor([m[s:s + window] for m, s in zip(melodies, starts)], dtype=torch.long).to(device)
+    mask = torch.triu(torch.ones(window, window), diagonal=1).bool().to(device)
+
+    rows = torch.tensor([b for b, pos in enumerate(positions) for _ in pos], device=device)
+    cols = torch.tensor([i - 1 for pos in positions for i in pos], device=device)
+    allowed_tensor = torch.tensor(allowed, device=device)
+    with torch.no_grad():
+        logits = model(batch_tensor, mask=mask)[rows, cols][:, allowed_tensor]
+        probs = torch.softmax(logits / temperature, dim=-1).cpu().tolist()
+
+    # 用 Python 的 random 采样，使断点中保存的随机数状态足以精确续训
+    k = 0
+    for m, s, pos in zip(melodies, starts, positions):
+        for i in pos:
+            m[s + i] = random.choices(allowed, weights=probs[k])[0]
+            k += 1
+    return melodies
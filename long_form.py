@@ -0,0 +1,93 @@
+# MusicAndMath/long_form.py
+import random
+import config
+import utils
+from main import GAEngine, PopulationIndex, get_user_chord_progression
+
+def chord_of_bar(bar):
+    return config.CHORD_ROOTS[bar % len(config.CHORD_ROOTS)]
+
+def evolve_motifs(use_nn=False):
+    """第一层：为和弦走向中的每个和弦进化一组单小节动机"""
+    steps_per_bar = config.BEATS_PER_BAR * config.STEPS_PER_BEAT
+    library = {}
+    for root in dict.fromkeys(config.CHORD_ROOTS):
+        print(f"\n[Motifs] Chord root {root}")
+        engine = GAEngine(target_gens=config.MOTIF_GENERATIONS, population_size=config.MOTIF_POPULATION,
+                          genome_length=steps_per_bar)
+        # 单小节动机不评终止式：否则每个动机都会被推向以主音结尾
+        engine.train(constraints_override={'CHORD_ROOTS': [root],
+                                           'ELITISM_COUNT': config.MOTIF_POPULATION // 5,
+                                           'FITNESS_INCLUDE_CADENCE': False}, use_nn=use_nn)
+        # final_population 已按分数排序，取前几个不同的动机
+        ranked = PopulationIndex([ind for _, ind in engine.final_population]).unique()
+        library[root] = ranked[:config.MOTIFS_PER_CHORD]
+    return library
+
+def render_arrangement(arrangement, library):
+    """把每小节的动机编号展开成完整旋律"""
+    melody = []
+    for bar, slot in enumerate(arrangement):
+        melody.extend(library[chord_of_bar(bar)][slot])
+    return melody
+
+def random_arrangement(num_bars, library):
+    return [random.randrange(len(library[chord_of_bar(bar)])) for bar in range(num_bars)]
+
+def mutate_arrangement(arrangement, library, rate):
+    if random.random() > rate: return arrangement
+    arrangement = arrangement[:]
+    if random.random() < 0.5:
+        # 换一个动机
+        bar = random.randrange(len(arrangement))
+        arrangement[bar] = random.randrange(len(library[chord_of_bar(bar)]))
+    else:
+        # 乐句重复：把一个乐句复制到另一个乐句（只复制和弦相同的小节）
+        phrase_count = (len(arrangement) + config.PHRASE_BARS - 1) // config.PHRASE_BARS
+        src = random.randrange(phrase_count) * config.PHRASE_BARS
+        dst = random.randrange(phrase_count) * config.PHRASE_BARS
+        for i in range(config.PHRASE_BARS):
+            if dst + i < len(arrangement) and src + i < len(arrangement) and \
+               chord_of_bar(src + i) == chord_of_bar(dst + i):
+                arrangement[dst + i] = arrangement[src + i]
+    return arrangement
+
+def evolve_arrangement(library, num_bars, use_nn=False):
+    """第二层：用 GAEngine 进化乐句层面的动机编排，基因是每小节的动机编号，评分只与长度线性相关"""
+    print(f"\n[Arrangement] {num_bars} bars")
+    engine = GAEngine(target_gens=config.ARRANGEMENT_GENERATIONS, population_size=config.ARRANGEMENT_POPULATION,
+                      mutation_rate=0.5, genome_length=num_bars,
+                      random_genome=lambda: random_arrangement(num_bars, library),
+                      mutate=lambda arrangement, rate: mutate_arrangement(arrangement, library, rate),
+                      render=lambda arrangement: render_arrangement(arrangement, library))
+    return engine.train(constraints_override={'ELITISM_COUNT': config.ARRANGEMENT_POPULATION // 5}, use_nn=use_nn)
+
+def refine(melody, use_nn=False):
+    """第三层：以编排结果为种子，在音符层面做少量微调"""
+    print(f"\n[Refine] {len(melody)} steps")
+    engine = GAEngine(target_gens=config.REFINE_GENERATIONS, population_size=config.REFINE_POPULATION,
+                      genome_length=len(melody))
+    return engine.train(initial_seed=melody,
+                        constraints_override={'ELITISM_COUNT': config.REFINE_POPULATION // 5}, use_nn=use_nn)
+
+def generate_long_form(num_bars=None, chord_roots=None, use_nn=False):
+    """分层生成长旋律：单小节动机 -> 乐句编排 -> 音符微调"""
+    num_bars = num_bars if num_bars else config.LONG_FORM_BARS
+    original_roots = config.CHORD_ROOTS
+    if chord_roots:
+        config.CHORD_ROOTS = chord_roots
+    try:
+        library = evolve_motifs(use_nn=use_nn)
+        arrangement = evolve_arrangement(library, num_bars, use_nn=use_nn)
+        melody = render_arrangement(arrangement, library)
+        if config.REFINE_GENERATIONS:
+            melody = refine(melody, use_nn=use_nn)
+        return melody
+    finally:
+        config.CHORD_ROOTS = original_roots
+
+if __name__ == "__main__":
+    user_chords = get_user_chord_progression()
+    melody = generate_long_form(chord_roots=user_chords, use_nn=config.USE_NN_FITNESS)
+    utils.save_movement_to_midi(melody, "long_form.mid", tempo=96,
+                                chord_progression=user_chords if user_chords else config.CHORD_ROOTS)
@@ -1,8 +1,17 @@
 # MusicAndMath/main.py
+import argparse
+import gzip
+import math
+import os
+import pickle
 import random
+import time
 import config
 import utils
-from fitness_function import get_fitness,get_nn_score
+from fitness_function import get_fitness,get_nn_score,invariant_cache_stats
+from guided_mutation import model_guided_mutation
+from surrogate import SurrogateModel
+from profiler import PROFILER, add_profile_arguments, enable_from_args
 
 def op_micro_adjust(melody):
     if len(melody) == 0: return melody
@@ -49,11 +58,14 @@ def op_shadow_echo(melody):
     return melody
 
 def op_rhythm_clone(melody):
-    """动机克隆"""
+    """动机克隆：把某个乐句第 1 小节的节奏复制到该乐句后半的第 1 小节"""
     steps_per_bar = config.BEATS_PER_BAR * config.STEPS_PER_BEAT
-    if len(melody) >= 3 * steps_per_bar:
-        bar0 = melody[0:steps_per_bar]
-        bar2_start = 2 * steps_per_bar
+    half = config.PHRASE_BARS // 2
+    phrase_starts = range(0, len(melody) - (half + 1) * steps_per_bar + 1, config.PHRASE_BARS * steps_per_bar)
+    if phrase_starts:
+        src_start = random.choice(phrase_starts)
+        bar0 = melody[src_start:src_start + steps_per_bar]
+        bar2_start = src_start + half * steps_per_bar
         for i in range(steps_per_bar):
             if bar0[i] > 0:
                 if melody[bar2_start + i] == 0:
@@ -87,18 +99,234 @@ def op_inversion_segment(melody):
             melody[start+i] = new_pitch
     return melody
 
+# 模型引导变异在 mutate_dispatcher 中的标记：选中的后代先放入 guided_batch，
+# 由 GAEngine 每代批量调用 model_guided_mutation 一次完成
+MODEL_GUIDED = 'model_guided'
+
 def crossover(p1, p2):
     """单点交叉"""
     if len(p1) < 2: return p1, p2
     point = random.randint(1, len(p1) - 1)
     return p1[:point] + p2[point:], p2[:point] + p1[point:]
 
+class PopulationIndex:
+    """按基因哈希索引种群：相同的旋律只评估一次，并提供多样性指标"""
+    def __init__(self, population):
+        self.size = len(population)
+        self.groups = {}
+        for i, ind in enumerate(population):
+            self.groups.setdefault(tuple(ind), []).append(i)
+
+    @property
+    def unique_count(self):
+        return len(self.groups)
+
+    @property
+    def diversity(self):
+        """不同旋律所占比例"""
+        return self.unique_count / self.size if self.size else 0.0
+
+    @property
+    def largest_clone(self):
+        return max((len(idx) for idx in self.groups.values()), default=0)
+
+    @property
+    def entropy(self):
+        """按克隆数量计算的香农熵，归一化到 [0, 1]"""
+        if self.size <= 1: return 0.0
+        h = -sum(len(idx) / self.size * math.log(len(idx) / self.size) for idx in self.groups.values())
+        return h / math.log(self.size)
+
+    def unique(self):
+        return [list(key) for key in self.groups]
+
+    def fan_out(self, unique_scores):
+        """把每个不同旋律的分数分发回原种群的每个位置"""
+        scores = [None] * self.size
+        for score, idx in zip(unique_scores, self.groups.values()):
+            for i in idx:
+                scores[i] = score
+        return scores
+
+    def surplus(self, max_copies):
+        """超出 max_copies 的多余克隆在原种群中的位置"""
+        return [i for idx in self.groups.values() for i in idx[max_copies:]]
+
+def config_snapshot():
+    """当前 config 中所有大写参数的快照"""
+    return {k: getattr(config, k) for k in dir(config) if k.isupper()}
+
+def save_checkpoint(path, state):
+    """将训练状态写入 gzip 压缩的 pickle 文件（先写临时文件再替换，避免写到一半被中断）"""
+    state = dict(state)
+    state['population'] = [bytes(ind) for ind in state['population']]
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    with gzip.open(path, "rb") as f:
+        state = pickle.load(f)
+    state['population'] = [list(ind) for ind in state['population']]
+    return state
+
+
+CLONE_POLICIES = (None, 'random', 'mutate')
+
+# 改变评分目标的参数：断点中的分数在这些参数改变后不再可比，不能续训
+OBJECTIVE_CONFIG_KEYS = ('CHORD_ROOTS', 'USE_NN_FITNESS', 'NN_MODEL_PATH', 'NN_CONTEXT', 'FITNESS_INCLUDE_CADENCE',
+                         'PHRASE_BARS', 'PITCH_MIN', 'PITCH_MAX', 'BEATS_PER_BAR', 'STEPS_PER_BEAT',
+                         'SCALE_C_MAJOR')
 
 class GAEngine:
-    def __init__(self, target_gens=None, population_size=None, mutation_rate=None):
+    def __init__(self, target_gens=None, population_size=None, mutation_rate=None,
+                 time_budget=None, fitness_target=None, plateau_window=None,
+                 plateau_min_rate=None, diversity_floor=None,
+                 checkpoint_path=None, checkpoint_interval=None,
+                 clone_policy=None, clone_max_copies=None, genome_length=None,
+                 model_mutation_weight=None, use_surrogate=None,
+                 random_genome=None, mutate=None, render=None, keep_checkpoint=False):
         self.target_gens = target_gens if target_gens else config.GENERATIONS
         self.pop_size = population_size if population_size else config.POPULATION_SIZE
         self.base_mutation_rate = mutation_rate if mutation_rate else config.MUTATION_RATE_BASE
+        self.genome_length = genome_length if genome_length else config.TOTAL_STEPS
+        # 可替换的基因操作：默认基因就是旋律本身；其他编码（如 long_form 的动机编排）
+        # 提供随机生成、变异，以及把基因展开成旋律的 render 用于评分
+        self.random_genome = random_genome if random_genome else lambda: utils.generate_random_melody(self.genome_length)
+        self.mutate = mutate if mutate else self.mutate_dispatcher
+        self.render = render if render else lambda genome: genome
+        self.time_budget = time_budget if time_budget is not None else config.TIME_BUDGET
+        self.fitness_target = fitness_target if fitness_target is not None else config.FITNESS_TARGET
+        self.plateau_window = plateau_window if plateau_window is not None else config.PLATEAU_WINDOW
+        self.plateau_min_rate = plateau_min_rate if plateau_min_rate is not None else config.PLATEAU_MIN_RATE
+        self.diversity_floor = diversity_floor if diversity_floor is not None else config.DIVERSITY_FLOOR
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval if checkpoint_interval else config.CHECKPOINT_INTERVAL
+        # keep_checkpoint=True 时训练结束不删除断点，而是写入带结果的最终断点，由调用方在保存结果后删除
+        self.keep_checkpoint = keep_checkpoint
+        self.clone_policy = clone_policy if clone_policy is not None else config.CLONE_POLICY
+        if self.clone_policy not in CLONE_POLICIES:
+            raise ValueError(f"clone_policy must be one of {CLONE_POLICIES}, got {self.clone_policy!r}")
+        self.clone_max_copies = clone_max_copies if clone_max_copies else config.CLONE_MAX_COPIES
+        if model_mutation_weight is None:
+            # 没有训练好的模型时，模型给出的建议没有意义
+            model_mutation_weight = config.MODEL_MUTATION_WEIGHT if os.path.exists(config.NN_MODEL_PATH) else 0
+        self.model_mutation_weight = model_mutation_weight
+        self.guided_batch = []
+        self.use_surrogate = use_surrogate if use_surrogate is not None else config.USE_SURROGATE
+        self.surrogate = None
+        self.eval_stats = {'evaluated': 0, 'skipped': 0}
+        self.stop_reason = None
+        self.history = []
+        self.final_population = []
+
+    def check_stop(self, gen, elapsed, best_score, diversity):
+        """返回停止原因，未满足任何条件时返回 None"""
+        if self.fitness_target is not None and best_score >= self.fitness_target:
+            return 'fitness_target'
+        if self.time_budget is not None and elapsed >= self.time_budget:
+            return 'time_budget'
+        if self.plateau_window and len(self.history) > self.plateau_window:
+            old = self.history[-1 - self.plateau_window]
+            rate = (best_score - old) / (abs(old) + 1e-9) / self.plateau_window
+            if rate < self.plateau_min_rate:
+                return 'plateau'
+        if self.diversity_floor is not None and diversity < self.diversity_floor:
+            return 'diversity_floor'
+        if gen == self.target_gens - 1:
+            return 'target_gens'
+        return None
+
+    def engine_settings(self, use_nn):
+        return {'target_gens': self.target_gens, 'pop_size': self.pop_size,
+                'base_mutation_rate': self.base_mutation_rate, 'genome_length': self.genome_length,
+                'use_nn': use_nn}
+
+    def restore_checkpoint(self, use_nn):
+        """读取断点；引擎参数或影响评分目标的参数与断点不一致时不续训，返回 None 从头开始"""
+        state = load_checkpoint(self.checkpoint_path)
+        settings = self.engine_settings(use_nn)
+        if state['engine'] != settings:
+            print(f"  [Resume] Ignoring {self.checkpoint_path}: engine settings differ "
+                  f"({state['engine']} vs {settings}), starting fresh.")
+            return None
+        current = config_snapshot()
+        objective_changed = [k for k in OBJECTIVE_CONFIG_KEYS if state['config'].get(k) != current.get(k)]
+        if objective_changed:
+            print(f"  [Resume] Ignoring {self.checkpoint_path}: scoring config differs "
+                  f"({objective_changed}), starting fresh.")
+            return None
+        changed = [k for k, v in state['config'].items() if current.get(k) != v]
+        if changed:
+            print(f"  [Resume] Warning: config differs from checkpoint: {changed}")
+        random.setstate(state['rng'])
+        print(f"  [Resume] Loaded {self.checkpoint_path} at Gen {state['gen']:03d}")
+        return state
+
+    def replace_clones(self, population):
+        """按 clone_policy 把多余的克隆替换为随机旋律或其变异体"""
+        index = PopulationIndex(population)
+        taken = set(index.groups)
+        for i in index.surplus(self.clone_max_copies):
+            replacement = None
+            if self.clone_policy == 'mutate':
+                # 很多算子可能原样返回，重试几次仍得不到新旋律就改用随机旋律
+                for _ in range(config.CLONE_MUTATE_RETRIES):
+                    candidate = self.mutate(population[i], 1.0)
+                    if tuple(candidate) not in taken:
+                        replacement = candidate
+                        break
+                    # 被拒绝的候选如果排进了模型引导批次，要移出，免得白跑一次前向
+                    if self.guided_batch and self.guided_batch[-1] is candidate:
+                        self.guided_batch.pop()
+            if replacement is None:
+                replacement = self.random_genome()
+            population[i] = replacement
+            taken.add(tuple(replacement))
+        self.apply_guided_batch()
+        return population
+
+    def screen_children(self, new_pop, elite_count):
+        """
+        代理模型筛选：new_pop 是精英加上多繁殖出的后代（约 1 / SURROGATE_KEEP 倍）。
+        后代去重后按预测分数排序，从高到低录取不同的基因，直到种群恰好 pop_size 个。
+        与精英或已录取基因相同的克隆不经筛选（去重后不需要额外评估）；每个基因的副本数
+        按 SURROGATE_KEEP 缩放回正常繁殖规模，避免多繁殖出的精英克隆挤占新基因的位置。
+        """
+        elites, children = new_pop[:elite_count], new_pop[elite_count:]
+        elite_keys = set(tuple(ind) for ind in elites)
+        copies = {}
+        for child in children:
+            key = tuple(child)
+            copies[key] = copies.get(key, 0) + 1
+        quota = {key: math.ceil(n * config.SURROGATE_KEEP) for key, n in copies.items()}
+        admitted = set(key for key in copies if key in elite_keys)
+        total = len(elites) + sum(quota[key] for key in admitted)
+        novel = [key for key in copies if key not in elite_keys]
+        if novel and total < self.pop_size:
+            predictions = self.surrogate.predict([self.render(list(key)) for key in novel])
+            ranked = sorted(range(len(novel)), key=lambda i: predictions[i], reverse=True)
+            for rank, i in enumerate(ranked):
+                if total >= self.pop_size:
+                    self.eval_stats['screened'] += len(novel) - rank
+                    break
+                admitted.add(novel[i])
+                total += quota[novel[i]]
+        kept = []
+        for child in children:
+            key = tuple(child)
+            if key in admitted and quota[key] > 0:
+                kept.append(child)
+                quota[key] -= 1
+        return (elites + kept)[:self.pop_size]
+
+    def apply_guided_batch(self):
+        """对本轮选中模型引导变异的后代做一次批量前向"""
+        if self.guided_batch:
+            with PROFILER.stage('mutate.guided'):
+                model_guided_mutation(self.guided_batch)
+            self.guided_batch = []
 
     def mutate_dispatcher(self, melody, rate):
         if random.random() > rate: return melody
@@ -111,55 +339,143 @@ class GAEngine:
             (op_rhythm_clone,     0.10), 
             (op_retrograde_segment, 0.05),
             (op_inversion_segment,  0.05),
-            (utils.generate_random_melody, 0.15)
+            (utils.generate_random_melody, 0.15),
+            (MODEL_GUIDED, self.model_mutation_weight)
         ]
         
-        r = random.random()
+        r = random.random() * sum(weight for _, weight in strategies)
         cumulative = 0
         for func, weight in strategies:
             cumulative += weight
             if r < cumulative:
-                if func == utils.generate_random_melody:
-                    return func() 
-                return func(new_melody)
+                if func is MODEL_GUIDED:
+                    # 实际耗时记在 mutate.guided 阶段
+                    self.guided_batch.append(new_melody)
+                    return new_melody
+                with PROFILER.stage('mutate.' + func.__name__):
+                    if func == utils.generate_random_melody:
+                        return func(self.genome_length)
+                    return func(new_melody)
         
         return new_melody
 
     def train(self, initial_seed=None, constraints_override=None, use_nn=False):
         original_settings = {}
         if constraints_override:
-            for k, v in constraints_override.items():
-                if hasattr(config, k):
-                    original_settings[k] = getattr(config, k)
-                    setattr(config, k, v)
-                    print(f"  [Config Override] Set {k} = {v}")
+            with PROFILER.stage('config_override'):
+                for k, v in constraints_override.items():
+                    if hasattr(config, k):
+                        original_settings[k] = getattr(config, k)
+                        setattr(config, k, v)
+                        print(f"  [Config Override] Set {k} = {v}")
 
         try:
-            if initial_seed:
-                population = [self.mutate_dispatcher(initial_seed[:], 0.2) for _ in range(self.pop_size)]
-                print(f"  [Init] Pop initialized from Seed.")
+            state = None
+            if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+                state = self.restore_checkpoint(use_nn)
+
+            if state and state.get('stop_reason'):
+                self.stop_reason = state['stop_reason']
+                self.history = state['history']
+                self.final_population = state['final_population']
+                print(f"  [Resume] Run already finished ({self.stop_reason}), returning its result.")
+                return state['best_ever']
+            if state:
+                population = state['population']
+                stats = state['stats']
+                best_ever_score, best_ever = state['best_ever_score'], state['best_ever']
+                self.stop_reason = None
+                self.history = state['history']
+                start_gen = state['gen']
+                start_time = time.perf_counter() - state['elapsed']
+                self.surrogate = state['surrogate']
             else:
-                population = [utils.generate_random_melody() for _ in range(self.pop_size)]
-                print(f"  [Init] Pop initialized randomly (Random Walk).")
+                with PROFILER.stage('init'):
+                    if initial_seed:
+                        population = [self.mutate(initial_seed[:], 0.2) for _ in range(self.pop_size)]
+                        self.apply_guided_batch()
+                        print(f"  [Init] Pop initialized from Seed.")
+                    else:
+                        population = [self.random_genome() for _ in range(self.pop_size)]
+                        print(f"  [Init] Pop initialized randomly (Random Walk).")
+
+                stats = {'stag_count': 0, 'best_score': -9999, 'mut_rate': self.base_mutation_rate}
+                best_ever_score, best_ever = float('-inf'), None
+                self.stop_reason = None
+                self.history = []
+                start_gen = 0
+                start_time = time.perf_counter()
+                self.surrogate = SurrogateModel() if self.use_surrogate else None
 
-            stats = {'stag_count': 0, 'best_score': -9999, 'mut_rate': self.base_mutation_rate}
+            self.eval_stats = {'evaluated': 0, 'skipped': 0, 'screened': 0}
+            cache_start = invariant_cache_stats()
+            self.final_population = []
+
+            def snapshot(next_gen):
+                with PROFILER.stage('checkpoint'):
+                    save_checkpoint(self.checkpoint_path, {
+                        'gen': next_gen, 'population': population,
+                        'stats': stats, 'best_ever_score': best_ever_score, 'best_ever': best_ever,
+                        'history': self.history, 'stop_reason': self.stop_reason,
+                        'final_population': self.final_population,
+                        'elapsed': time.perf_counter() - start_time, 'rng': random.getstate(),
+                        'config': config_snapshot(), 'engine': self.engine_settings(use_nn),
+                        'surrogate': self.surrogate,
+                    })
 
             print(f"Start Training: {self.target_gens} Gens")
             
-            for gen in range(self.target_gens):
+            for gen in range(start_gen, self.target_gens):
+                PROFILER.begin_generation(gen)
                 valid_pop = [ind for ind in population if len(ind) > 0]
-                if not valid_pop: valid_pop = [utils.generate_random_melody() for _ in range(self.pop_size)]
-                if use_nn:
-                    nn_scores = get_nn_score(valid_pop)
-                    scored_pop = list(zip(nn_scores, valid_pop))
-                else:
-                    scored_pop = [(get_fitness(ind, use_nn=False), ind) for ind in valid_pop]
+                if not valid_pop: valid_pop = [self.random_genome() for _ in range(self.pop_size)]
+                if self.clone_policy:
+                    with PROFILER.stage('clone_replace'):
+                        valid_pop = self.replace_clones(valid_pop)
+                with PROFILER.stage('dedup_index'):
+                    index = PopulationIndex(valid_pop)
+                    unique_pop = index.unique()
+                    unique_melodies = [self.render(g) for g in unique_pop]
+                with PROFILER.stage('evaluate'):
+                    if use_nn:
+                        unique_scores = get_nn_score(unique_melodies)
+                    else:
+                        unique_scores = [get_fitness(m, use_nn=False) for m in unique_melodies]
+                self.eval_stats['evaluated'] += index.unique_count
+                self.eval_stats['skipped'] += index.size - index.unique_count
+                if self.surrogate:
+                    with PROFILER.stage('surrogate.train'):
+                        # 只用新出现的旋律：精英每代都会重复出现，重复加入会让训练集偏向它们，也会低估误差
+                        new_melodies, new_scores = self.surrogate.unseen(unique_melodies, unique_scores)
+                        if self.surrogate.trained and new_melodies:
+                            self.surrogate.record_error(new_melodies, new_scores)
+                        self.surrogate.add(new_melodies, new_scores)
+                        if (gen + 1) % config.SURROGATE_RETRAIN_INTERVAL == 0:
+                            self.surrogate.fit()
+                scored_pop = list(zip(index.fan_out(unique_scores), valid_pop))
                 
                 scored_pop.sort(key=lambda x: x[0], reverse=True)
                 
                 
                 current_best_score, best_melody = scored_pop[0]
-                
+                if current_best_score > best_ever_score:
+                    best_ever_score, best_ever = current_best_score, best_melody
+                self.history.append(best_ever_score)
+
+                diversity = index.diversity
+                self.stop_reason = self.check_stop(gen, time.perf_counter() - start_time,
+                                                   best_ever_score, diversity)
+                if self.stop_reason:
+                    print(f"Gen {gen:03d} | Best: {best_ever_score:.2f} | Diversity: {diversity:.2f}")
+                    print(f"  [Stop] {self.stop_reason} after {gen + 1} gens, "
+                          f"{time.perf_counter() - start_time:.1f}s, "
+                          f"{self.eval_stats['skipped']} duplicate evaluations skipped, "
+                          f"{self.eval_stats['screened']} children screened out")
+                    hits, misses = (now - before for now, before in zip(invariant_cache_stats(), cache_start))
+                    if hits + misses:
+                        print(f"  [Cache] Invariant fitness cache hit rate: {hits / (hits + misses):.1%} "
+                              f"({hits} hits, {misses} misses)")
+                    break
                 if current_best_score > stats['best_score'] + 0.1:
                     stats['stag_count'] = 0
                     stats['best_score'] = current_best_score
@@ -169,28 +485,54 @@ class GAEngine:
                     if stats['stag_count'] > 10: stats['mut_rate'] = min(0.8, self.base_mutation_rate * 2.0)
                 if stats['stag_count'] > 50:
                     survivors = [p[1] for p in scored_pop[:5]] 
-                    new_blood = [utils.generate_random_melody() for _ in range(self.pop_size - 5)]
+                    new_blood = [self.random_genome() for _ in range(self.pop_size - 5)]
                     population = survivors + new_blood
                     stats['stag_count'] = 0
-                    continue 
-                new_pop = []
-                elite_count = config.ELITISM_COUNT
-                new_pop.extend([p[1] for p in scored_pop[:elite_count]])
-                
-                while len(new_pop) < self.pop_size:
-                    parent1 = max(random.sample(scored_pop, 5), key=lambda x:x[0])[1]
-                    parent2 = max(random.sample(scored_pop, 5), key=lambda x:x[0])[1]
-                    child1, child2 = crossover(parent1, parent2)
-                    child1 = self.mutate_dispatcher(child1, stats['mut_rate'])
-                    child2 = self.mutate_dispatcher(child2, stats['mut_rate'])
-                    new_pop.extend([child1, child2])
-                population = new_pop[:self.pop_size]
-                if gen % 20 == 0 or gen == self.target_gens - 1:
-                    print(f"Gen {gen:03d} | Best: {current_best_score:.2f}")
-            return scored_pop[0][1]
+                else:
+                    new_pop = []
+                    elite_count = config.ELITISM_COUNT
+                    new_pop.extend([p[1] for p in scored_pop[:elite_count]])
+
+                    screening = self.surrogate and self.surrogate.trained
+                    target_size = self.pop_size
+                    if screening:
+                        # 多繁殖一些后代，筛选后仍能填满种群
+                        elite_kept = min(elite_count, self.pop_size)
+                        target_size = elite_kept + math.ceil((self.pop_size - elite_kept) / config.SURROGATE_KEEP)
+                    with PROFILER.stage('breed'):
+                        while len(new_pop) < target_size:
+                            with PROFILER.stage('select'):
+                                parent1 = max(random.sample(scored_pop, 5), key=lambda x:x[0])[1]
+                                parent2 = max(random.sample(scored_pop, 5), key=lambda x:x[0])[1]
+                            with PROFILER.stage('crossover'):
+                                child1, child2 = crossover(parent1, parent2)
+                            child1 = self.mutate(child1, stats['mut_rate'])
+                            child2 = self.mutate(child2, stats['mut_rate'])
+                            new_pop.extend([child1, child2])
+                    self.apply_guided_batch()
+                    if screening:
+                        with PROFILER.stage('surrogate.screen'):
+                            population = self.screen_children(new_pop, elite_count)
+                    else:
+                        population = new_pop[:self.pop_size]
+                    if gen % 20 == 0:
+                        surrogate_info = ""
+                        if self.surrogate and self.surrogate.last_error is not None:
+                            surrogate_info = f" | Surrogate MAE: {self.surrogate.last_error:.2f}"
+                        print(f"Gen {gen:03d} | Best: {current_best_score:.2f} | Unique: {index.unique_count}/{index.size}{surrogate_info}")
+                if self.checkpoint_path and (gen + 1) % self.checkpoint_interval == 0:
+                    snapshot(gen + 1)
+            PROFILER.end_trace()
+            self.final_population = scored_pop
+            if self.checkpoint_path and self.keep_checkpoint:
+                snapshot(len(self.history))
+            elif self.checkpoint_path and os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+            return best_ever
         finally:
-            for k, v in original_settings.items():
-                setattr(config, k, v)
+            with PROFILER.stage('config_override'):
+                for k, v in original_settings.items():
+                    setattr(config, k, v)
 
 def get_user_chord_progression():
     """获取用户输入的和弦走向"""
@@ -211,12 +553,17 @@ def train(**kwargs):
     return engine.train()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成一个四小节乐句")
+    add_profile_arguments(parser)
+    enable_from_args(parser.parse_args())
     user_chords = get_user_chord_progression()
     use_nn=config.USE_NN_FITNESS
     constraints = {}
     if user_chords:
         constraints['CHORD_ROOTS'] = user_chords
         print(f"使用自定义和弦: {user_chords}")
-    engine = GAEngine(target_gens=200) 
+    engine = GAEngine(target_gens=200, checkpoint_path=config.CHECKPOINT_PATH)
     final_melody = engine.train(constraints_override=constraints,use_nn=use_nn)
-    utils.save_melody_to_midi(final_melody, "music.mid")
\ No newline at end of file
+    with PROFILER.stage('midi_write'):
+        utils.save_melody_to_midi(final_melody, "music.mid")
+    PROFILER.report()
\ No newline at end of file
@@ -0,0 +1,122 @@
+# MusicAndMath/profiler.py
+import cProfile
+import os
+import time
+import config
+
+class _NullTimer:
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total += time.perf_counter() - self._start
+        self.calls += 1
+        return False
+
+class StageProfiler:
+    """
+    分阶段计时：未开启时 stage() 返回空计时器，几乎没有开销。
+    开启后对抽样的代额外记录 cProfile 或 torch.profiler 的 trace。
+    """
+    def __init__(self):
+        self.enabled = False
+        self.timers = {}
+        self.output_dir = None
+        self.tracer = None
+        self.sample_every = None
+        self.section = "run"
+        self.trace_files = []
+        self._trace = None
+        self._trace_path = None
+        self._start = 0.0
+
+    def enable(self, output_dir=None, tracer=None, sample_every=None):
+        self.enabled = True
+        self.output_dir = output_dir if output_dir else config.PROFILE_DIR
+        self.tracer = tracer if tracer else config.PROFILE_TRACER
+        self.sample_every = sample_every if sample_every else config.PROFILE_SAMPLE_EVERY
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._start = time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled: return _NULL_TIMER
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = _StageTimer()
+        return timer
+
+    def begin_generation(self, gen):
+        """结束上一代的 trace；如果这一代被抽中，开始新的 trace"""
+        if not self.enabled: return
+        self.end_trace()
+        if self.tracer == 'none' or gen % self.sample_every != 0: return
+        name = f"{self.section}_gen{gen:03d}"
+        if self.tracer == 'torch':
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._trace = torch.profiler.profile(activities=activities)
+            self._trace_path = os.path.join(self.output_dir, name + ".json")
+        else:
+            self._trace = cProfile.Profile()
+            self._trace_path = os.path.join(self.output_dir, name + ".prof")
+        self._trace.__enter__()
+
+    def end_trace(self):
+        if self._trace is None: return
+        self._trace.__exit__(None, None, None)
+        if self.tracer == 'torch':
+            self._trace.export_chrome_trace(self._trace_path)
+        else:
+            self._trace.dump_stats(self._trace_path)
+        self.trace_files.append(self._trace_path)
+        self._trace = None
+
+    def summary(self):
+        wall = time.perf_counter() - self._start
+        lines = [f"{'Stage':<28}{'Calls':>10}{'Total (s)':>12}{'Mean (ms)':>12}{'% Wall':>9}"]
+        for name, t in sorted(self.timers.items(), key=lambda x: x[1].total, reverse=True):
+            mean_ms = t.total / t.calls * 1000 if t.calls else 0.0
+            lines.append(f"{name:<28}{t.calls:>10}{t.total:>12.3f}{mean_ms:>12.3f}{t.total / wall * 100:>8.1f}%")
+        lines.append(f"Wall time: {wall:.3f}s (stages may nest, so percentages can add up to more than 100%)")
+        return "\n".join(lines)
+
+    def report(self):
+        """打印汇总表，并写入 summary.txt"""
+        if not self.enabled: return
+        self.end_trace()
+        table = self.summary()
+        path = os.path.join(self.output_dir, "summary.txt")
+        with open(path, "w") as f:
+            f.write(table + "\n")
+        print("\n[Profile]\n" + table)
+        print(f"[Profile] Summary: {path}")
+        for trace_path in self.trace_files:
+            print(f"[Profile] Trace: {trace_path}")
+
+PROFILER = StageProfiler()
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", action="store_true", help="分阶段计时，并对抽样的代记录 trace")
+    parser.add_argument("--profile-dir", default=config.PROFILE_DIR, help="汇总表和 trace 文件的输出目录")
+    parser.add_argument("--trace", choices=["cprofile", "torch", "none"], default=config.PROFILE_TRACER,
+                        help="抽样代使用的 trace 工具")
+    parser.add_argument("--profile-every", type=int, default=config.PROFILE_SAMPLE_EVERY,
+                        help="每隔多少代抽样记录一次 trace")
+
+def enable_from_args(args):
+    if args.profile:
+        PROFILER.enable(args.profile_dir, args.trace, args.profile_every)
@@ -0,0 +1,79 @@
+# MusicAndMath/surrogate.py
+import numpy as np
+import config
+from fitness_function import get_dynamic_chords
+
+class SurrogateModel:
+    """
+    在线训练的线性代理模型（岭回归）：用本次训练已经评估过的 (旋律, 分数) 拟合，
+    在完整评估前预测后代的分数，只让有希望的后代进入完整评估。
+    """
+    def __init__(self, max_samples=None, l2=None):
+        self.max_samples = max_samples if max_samples else config.SURROGATE_MAX_SAMPLES
+        self.l2 = l2 if l2 else config.SURROGATE_L2
+        self.X = None
+        self.y = None
+        self.weights = None
+        self.last_error = None
+        self.seen = set()
+
+    @property
+    def trained(self):
+        return self.weights is not None
+
+    def features(self, melodies):
+        """起音/休止掩码、和弦内音掩码、音级直方图、音程直方图"""
+        M = np.asarray(melodies, dtype=np.int64)
+        length = M.shape[1]
+        steps_per_bar = config.BEATS_PER_BAR * config.STEPS_PER_BEAT
+        is_note = M > 0
+        changed = np.ones_like(is_note)
+        changed[:, 1:] = M[:, 1:] != M[:, :-1]
+        onsets = is_note & changed
+        rests = ~is_note
+
+        chords = get_dynamic_chords()
+        chord_table = np.zeros((length, 12), dtype=bool)
+        for i in range(length):
+            chord_table[i, list(chords[(i // steps_per_bar) % len(chords)])] = True
+        pcs = M % 12
+        in_chord = chord_table[np.arange(length), pcs] & is_note
+        out_of_scale = (~np.isin(pcs, list(config.SCALE_C_MAJOR)) & is_note).sum(axis=1, keepdims=True)
+
+        pc_hist = np.stack([((pcs == pc) & is_note).sum(axis=1) for pc in range(12)], axis=1)
+        steps = np.clip(M[:, 1:] - M[:, :-1], -12, 12)
+        moving = is_note[:, 1:] & is_note[:, :-1] & (steps != 0)
+        interval_hist = np.stack([((steps == d) & moving).sum(axis=1) for d in range(-12, 13)], axis=1)
+
+        bias = np.ones((M.shape[0], 1))
+        return np.hstack([onsets, rests, in_chord, out_of_scale, pc_hist, interval_hist, bias]).astype(np.float32)
+
+    def unseen(self, melodies, scores):
+        """筛掉已经加入过训练集的旋律（例如每代保留下来的精英），返回 (旋律, 分数)"""
+        fresh = [(m, s) for m, s in zip(melodies, scores) if tuple(m) not in self.seen]
+        return [m for m, _ in fresh], [s for _, s in fresh]
+
+    def add(self, melodies, scores):
+        if not melodies: return
+        self.seen.update(tuple(m) for m in melodies)
+        X = self.features(melodies)
+        y = np.asarray(scores, dtype=np.float32)
+        if self.X is None or self.X.shape[1] != X.shape[1]:
+            self.X, self.y = X, y
+        else:
+            self.X = np.vstack([self.X, X])[-self.max_samples:]
+            self.y = np.concatenate([self.y, y])[-self.max_samples:]
+
+    def fit(self):
+        if self.X is None or len(self.y) < config.SURROGATE_MIN_SAMPLES: return
+        X = self.X.astype(np.float64)
+        A = X.T @ X + self.l2 * np.eye(X.shape[1])
+        self.weights = np.linalg.solve(A, X.T @ self.y.astype(np.float64))
+
+    def predict(self, melodies):
+        return self.features(melodies) @ self.weights
+
+    def record_error(self, melodies, scores):
+        """用刚完成完整评估的旋律记录预测误差（平均绝对误差）"""
+        self.last_error = float(np.mean(np.abs(self.predict(melodies) - np.asarray(scores))))
+        return self.last_error